@@ -6,9 +6,12 @@ Uses Playwright to login and extract financial data via screenshots + Gemini vis
 
 import os
 import time
+import logging
 from typing import Any
 from playwright.sync_api import sync_playwright, Page, Browser
 
+log = logging.getLogger(__name__)
+
 
 class StockAnalysisBrowser:
     """Browser automation for StockAnalysis.com with persistent session."""
@@ -51,7 +54,7 @@ class StockAnalysisBrowser:
         max_attempts = 2
         for attempt in range(1, max_attempts + 1):
             try:
-                print(f"Login attempt {attempt}/{max_attempts}...")
+                log.info(f"Login attempt {attempt}/{max_attempts}...")
                 self.page.goto("https://stockanalysis.com/login/", timeout=30000)
                 self.page.wait_for_load_state("networkidle", timeout=15000)
 
@@ -71,25 +74,25 @@ class StockAnalysisBrowser:
                 time.sleep(2)  # Extra settle time
 
                 current_url = self.page.url
-                print(f"Post-login URL: {current_url}")
+                log.info(f"Post-login URL: {current_url}")
 
                 if "login" not in current_url.lower():
                     self.logged_in = True
-                    print("Login successful")
+                    log.info("Login successful")
                     return True
                 else:
-                    print(f"Still on login page after attempt {attempt}")
+                    log.warning(f"Still on login page after attempt {attempt}")
                     # Save debug screenshot
                     self.page.screenshot(path=f"/tmp/login_debug_attempt_{attempt}.png", full_page=True)
 
             except Exception as e:
-                print(f"Login error on attempt {attempt}: {e}")
+                log.warning(f"Login error on attempt {attempt}: {e}")
                 try:
                     self.page.screenshot(path=f"/tmp/login_error_attempt_{attempt}.png", full_page=True)
                 except Exception:
                     pass
 
-        print("All login attempts failed")
+        log.error("All login attempts failed")
         return False
 
     def _select_raw_units(self):
@@ -104,9 +107,9 @@ class StockAnalysisBrowser:
             raw_btn.first.click()
             time.sleep(0.5)
 
-            print("Selected 'Raw' number units")
+            log.info("Selected 'Raw' number units")
         except Exception as e:
-            print(f"Warning: Could not select Raw units: {e}")
+            log.warning(f"Warning: Could not select Raw units: {e}")
 
     def _build_url(self, ticker: str, statement_type: str, period: str, data_type: str) -> str:
         """
@@ -162,7 +165,7 @@ class StockAnalysisBrowser:
         url = self._build_url(ticker, statement_type, period, data_type)
 
         try:
-            print(f"Navigating to: {url}")
+            log.info(f"Navigating to: {url}")
             self.page.goto(url, timeout=30000)
             self.page.wait_for_load_state("networkidle", timeout=15000)
 
@@ -170,7 +173,7 @@ class StockAnalysisBrowser:
             try:
                 self.page.wait_for_selector("table", timeout=10000)
             except Exception:
-                print("Warning: table selector not found, proceeding with screenshot anyway")
+                log.warning("Warning: table selector not found, proceeding with screenshot anyway")
 
             time.sleep(1)  # Let any lazy-loaded content settle
 
@@ -196,7 +199,7 @@ class StockAnalysisBrowser:
             }
 
         except Exception as e:
-            print(f"Error navigating to {url}: {e}")
+            log.error(f"Error navigating to {url}: {e}")
             try:
                 self.page.screenshot(path=f"/tmp/nav_error_{ticker}_{statement_type}.png", full_page=True)
             except Exception:
@@ -0,0 +1,233 @@
+"""
+Caches for Claude calls.
+
+Replays identical messages.create requests from a local SQLite file, so
+re-running the same ticker/file during development returns instantly and
+deterministically instead of hitting the API again.
+
+Also records the write tool calls that completed a file so an identical
+file can be replayed without the agent loop (TrajectoryCache).
+
+Both are disabled unless AGENT_LLM_CACHE_PATH / AGENT_TRAJECTORY_CACHE_PATH
+are set.
+"""
+
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Any, Callable
+import orjson
+import anthropic
+from anthropic.types import Message
+
+log = logging.getLogger(__name__)
+
+# Request fields that affect the model output. Everything else passed to
+# messages.create (timeouts, extra headers, metadata) is left out of the key.
+KEY_FIELDS = (
+    "model",
+    "system",
+    "tools",
+    "messages",
+    "max_tokens",
+    "temperature",
+    "stop_sequences",
+    "tool_choice",
+)
+
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+
+
+def _default(obj: Any) -> Any:
+    """Serialize SDK content blocks (pydantic models) echoed back in messages."""
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump(mode="json", exclude_none=True)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def request_key(kwargs: dict[str, Any]) -> str:
+    """Hash the output-affecting request fields into a stable cache key."""
+    payload = {k: kwargs[k] for k in KEY_FIELDS if k in kwargs}
+    canonical = orjson.dumps(payload, default=_default, option=orjson.OPT_SORT_KEYS)
+    return hashlib.sha256(canonical).hexdigest()
+
+
+class ResponseCache:
+    """SQLite-backed store of Claude responses keyed by request hash."""
+
+    def __init__(self, path: str, ttl_seconds: int = DEFAULT_TTL_SECONDS):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, created_at REAL NOT NULL, body BLOB NOT NULL)"
+        )
+        self._conn.commit()
+
+    @classmethod
+    def from_env(cls) -> "ResponseCache | None":
+        """Build a cache from AGENT_LLM_CACHE_PATH / AGENT_LLM_CACHE_TTL, if set."""
+        path = os.environ.get("AGENT_LLM_CACHE_PATH")
+        if not path:
+            return None
+        ttl = int(os.environ.get("AGENT_LLM_CACHE_TTL", DEFAULT_TTL_SECONDS))
+        log.info(f"LLM response cache enabled at {path} (ttl {ttl}s)")
+        return cls(path, ttl)
+
+    def get(self, key: str) -> Message | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT created_at, body FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or time.time() - row[0] > self.ttl_seconds:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return Message.model_validate(orjson.loads(row[1]))
+
+    def set(self, key: str, message: Message):
+        body = orjson.dumps(message.model_dump(mode="json"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, created_at, body) VALUES (?, ?, ?)",
+                (key, time.time(), body),
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def _create(client: anthropic.Anthropic, on_block: Callable | None, **kwargs) -> Message:
+    """Call messages.create, or stream it when on_block wants blocks early."""
+    if on_block is None:
+        return client.messages.create(**kwargs)
+
+    with client.messages.stream(**kwargs) as stream:
+        for event in stream:
+            if event.type == "content_block_stop":
+                on_block(event.content_block)
+        return stream.get_final_message()
+
+
+def cached_create(
+    client: anthropic.Anthropic,
+    cache: ResponseCache | None,
+    on_block: Callable | None = None,
+    **kwargs,
+) -> Message:
+    """
+    Call Claude, serving identical requests from cache.
+
+    Args:
+        client: Anthropic client
+        cache: Response cache, or None to always call through
+        on_block: If given, the response is streamed and this is called with
+            each content block as soon as it is complete. Not called for
+            cached responses. Blocks arrive before the stop reason is known,
+            so a tool_use block's input may be cut short by max_tokens.
+        **kwargs: Arguments for messages.create
+
+    Returns:
+        The (possibly replayed) Message
+    """
+    if cache is None:
+        return _create(client, on_block, **kwargs)
+
+    key = request_key(kwargs)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    response = _create(client, on_block, **kwargs)
+    cache.set(key, response)
+    return response
+
+
+# Tools whose calls are recorded and replayed by TrajectoryCache. Read-only
+# tools (browsing, vision, search, notes) only exist to decide these writes.
+TRAJECTORY_TOOLS = ("insert_new_period_column", "update_excel_cell", "update_excel_cells")
+
+
+def trajectory_key(
+    ticker: str,
+    file_name: str,
+    target_date: str,
+    full_schema: str,
+    empty_cells: list[str],
+) -> str:
+    """Key a file run on its inputs: the exact file contents and the cells to fill."""
+    schema_signature = hashlib.sha256(full_schema.encode()).hexdigest()
+    empty_signature = hashlib.sha256(",".join(sorted(empty_cells)).encode()).hexdigest()
+    return f"{ticker}:{file_name}:{target_date}:{schema_signature}:{empty_signature}"
+
+
+class TrajectoryCache:
+    """
+    SQLite-backed store of the write tool calls that completed a file.
+
+    When a file is seen again with identical contents and targets, the
+    recorded writes are replayed without calling Claude at all. Each step
+    stores a hash of its original result; a mismatch on replay means the
+    environment drifted and the caller falls back to the agent loop.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS trajectories ("
+            "key TEXT PRIMARY KEY, created_at REAL NOT NULL, steps BLOB NOT NULL)"
+        )
+        self._conn.commit()
+
+    @classmethod
+    def from_env(cls) -> "TrajectoryCache | None":
+        """Build a cache from AGENT_TRAJECTORY_CACHE_PATH, if set."""
+        path = os.environ.get("AGENT_TRAJECTORY_CACHE_PATH")
+        if not path:
+            return None
+        log.info(f"Trajectory cache enabled at {path}")
+        return cls(path)
+
+    @staticmethod
+    def step(tool_name: str, tool_input: dict, result: str) -> dict[str, Any]:
+        """Build a recorded step from a tool call and its result."""
+        return {
+            "tool_name": tool_name,
+            "tool_input": tool_input,
+            "result_hash": hashlib.sha256(result.encode()).hexdigest(),
+        }
+
+    @staticmethod
+    def check(step: dict[str, Any], result: str) -> bool:
+        """Whether a replayed step produced the same result as when recorded."""
+        return hashlib.sha256(result.encode()).hexdigest() == step["result_hash"]
+
+    def get(self, key: str) -> list[dict[str, Any]] | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT steps FROM trajectories WHERE key = ?", (key,)
+            ).fetchone()
+        return orjson.loads(row[0]) if row else None
+
+    def set(self, key: str, steps: list[dict[str, Any]]):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO trajectories (key, created_at, steps) VALUES (?, ?, ?)",
+                (key, time.time(), orjson.dumps(steps)),
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -6,11 +6,24 @@ what data needs to be updated.
 """
 
 import os
+import hashlib
+import threading
+from collections import OrderedDict
+from io import BytesIO
 from pathlib import Path
 from typing import Any
 import openpyxl
+from openpyxl.cell.read_only import EMPTY_CELL
 from openpyxl.utils import get_column_letter
 
+__all__ = [
+    "analyze_excel_file",
+    "analyze_excel_file_full",
+    "format_full_schema_for_llm",
+    "analyze_all_files",
+    "format_schema_for_llm",
+]
+
 
 def analyze_excel_file(file_path: Path) -> dict[str, Any]:
     """
@@ -22,71 +35,7 @@ def analyze_excel_file(file_path: Path) -> dict[str, Any]:
     Returns:
         Dict containing sheet names, headers, sample data, and empty cells
     """
-    try:
-        workbook = openpyxl.load_workbook(file_path, data_only=True)
-
-        analysis = {
-            "file_name": file_path.name,
-            "sheets": [],
-        }
-
-        for sheet_name in workbook.sheetnames:
-            sheet = workbook[sheet_name]
-            sheet_info = {
-                "name": sheet_name,
-                "dimensions": sheet.dimensions,
-                "max_row": sheet.max_row,
-                "max_col": sheet.max_column,
-                "headers": [],
-                "sample_data": [],
-                "empty_cells": [],
-            }
-
-            # Get headers (first row)
-            if sheet.max_row >= 1:
-                for col in range(1, min(sheet.max_column + 1, 20)):
-                    cell = sheet.cell(row=1, column=col)
-                    if cell.value:
-                        sheet_info["headers"].append({
-                            "column": get_column_letter(col),
-                            "value": str(cell.value)[:100],
-                        })
-
-            # Get sample data (first 5 data rows)
-            for row in range(2, min(sheet.max_row + 1, 7)):
-                row_data = {}
-                for col in range(1, min(sheet.max_column + 1, 20)):
-                    cell = sheet.cell(row=row, column=col)
-                    col_letter = get_column_letter(col)
-
-                    if cell.value is not None:
-                        row_data[col_letter] = str(cell.value)[:50]
-                    else:
-                        sheet_info["empty_cells"].append(f"{col_letter}{row}")
-
-                if row_data:
-                    sheet_info["sample_data"].append(row_data)
-
-            # Look for cells that might need updating
-            empty_count = 0
-            for row in range(2, min(sheet.max_row + 1, 50)):
-                for col in range(1, min(sheet.max_column + 1, 20)):
-                    cell = sheet.cell(row=row, column=col)
-                    if cell.value is None:
-                        col_letter = get_column_letter(col)
-                        if len(sheet_info["empty_cells"]) < 50:
-                            if f"{col_letter}{row}" not in sheet_info["empty_cells"]:
-                                sheet_info["empty_cells"].append(f"{col_letter}{row}")
-                        empty_count += 1
-
-            sheet_info["total_empty_cells"] = empty_count
-            analysis["sheets"].append(sheet_info)
-
-        workbook.close()
-        return analysis
-
-    except Exception as e:
-        return {"error": str(e), "file_name": file_path.name}
+    return _analyze_cached(file_path)[0]
 
 
 def analyze_excel_file_full(file_path: Path) -> dict[str, Any]:
@@ -94,7 +43,9 @@ def analyze_excel_file_full(file_path: Path) -> dict[str, Any]:
     Analyze an Excel file and extract ALL row labels, headers, and cell values.
 
     This provides a complete picture of the file contents so the agent can see
-    exactly which cells are empty and what values already exist.
+    exactly which cells are empty and what values already exist. Results are
+    cached by file content and shared between callers, so treat them as
+    read-only.
 
     Args:
         file_path: Path to the Excel file
@@ -103,101 +54,266 @@ def analyze_excel_file_full(file_path: Path) -> dict[str, Any]:
         Dict with full grid data: headers, all rows with labels and cell values,
         and a list of empty cell references.
     """
+    return _analyze_cached(file_path)[1]
+
+
+# Analyses by workbook content hash. Keyed on content rather than path
+# so a retry of the same ticker (fresh temp dir, same bytes) in a warm
+# container skips re-parsing. Both analysis shapes come from one parse, so
+# asking for the summary and the full grid of a file costs a single load.
+_ANALYSIS_CACHE: OrderedDict[bytes, tuple[dict[str, Any], dict[str, Any]]] = OrderedDict()
+_ANALYSIS_CACHE_SIZE = 64
+_analysis_lock = threading.Lock()
+
+# Summary (analyze_excel_file) scan limits
+SUMMARY_MAX_ROW = 49
+SUMMARY_MAX_COL = 19
+
+# Full grid (analyze_excel_file_full) limits
+FULL_MAX_ROW = 200
+FULL_MAX_COL = 30
+
+
+def _analyze_cached(file_path: Path) -> tuple[dict[str, Any], dict[str, Any]]:
+    """Return (summary, full) analyses of a file, parsing it at most once."""
     try:
-        workbook = openpyxl.load_workbook(file_path, data_only=True)
+        data = file_path.read_bytes()
+    except Exception as e:
+        error = {"error": str(e), "file_name": file_path.name}
+        return error, error
+
+    key = hashlib.blake2b(data, digest_size=16).digest() + file_path.name.encode()
+    with _analysis_lock:
+        cached = _ANALYSIS_CACHE.get(key)
+        if cached is not None:
+            _ANALYSIS_CACHE.move_to_end(key)
+            return cached
+
+    analyses = _analyze_workbook(BytesIO(data), file_path.name)
+    if "error" not in analyses[1]:
+        with _analysis_lock:
+            _ANALYSIS_CACHE[key] = analyses
+            if len(_ANALYSIS_CACHE) > _ANALYSIS_CACHE_SIZE:
+                _ANALYSIS_CACHE.popitem(last=False)
+    return analyses
+
 
-        analysis = {
-            "file_name": file_path.name,
+def _analyze_workbook(source: BytesIO, file_name: str) -> tuple[dict[str, Any], dict[str, Any]]:
+    """Parse a workbook once and build both the summary and the full analysis."""
+    try:
+        workbook = openpyxl.load_workbook(source, read_only=True, data_only=True)
+
+        summary = {
+            "file_name": file_name,
+            "sheets": [],
+        }
+        full = {
+            "file_name": file_name,
             "sheets": [],
         }
 
         for sheet_name in workbook.sheetnames:
-            sheet = workbook[sheet_name]
-            max_col = min(sheet.max_column or 1, 30)  # Cap at 30 columns
-            max_row = min(sheet.max_row or 1, 200)     # Cap at 200 rows
-
-            # Extract headers (row 1)
-            headers = []
-            for col in range(1, max_col + 1):
-                cell = sheet.cell(row=1, column=col)
-                col_letter = get_column_letter(col)
-                val = str(cell.value) if cell.value is not None else ""
-                headers.append(f"{col_letter}: {val}")
-
-            # Extract all data rows
-            rows = []
-            empty_cells = []
-
-            for row_idx in range(2, max_row + 1):
-                # Column A is the row label
-                label_cell = sheet.cell(row=row_idx, column=1)
-                label = str(label_cell.value) if label_cell.value is not None else ""
-
-                # Skip completely empty rows (no label, no data)
-                has_any_data = label != ""
-                cells = {}
-
-                for col in range(2, max_col + 1):
-                    cell = sheet.cell(row=row_idx, column=col)
-                    col_letter = get_column_letter(col)
-
-                    if cell.value is not None:
-                        # Convert to string, preserve full numeric precision
-                        val = cell.value
-                        if isinstance(val, float) and val == int(val):
-                            cells[col_letter] = str(int(val))
-                        else:
-                            cells[col_letter] = str(val)
-                        has_any_data = True
-                    else:
-                        cells[col_letter] = "EMPTY"
-                        # Only track as empty if the row has a label
-                        # (empty cells in label-less rows aren't meaningful)
-                        if label:
-                            empty_cells.append(f"{col_letter}{row_idx}")
-
-                if has_any_data:
-                    rows.append({
-                        "row": row_idx,
-                        "label": label,
-                        "cells": cells,
-                    })
-
-            # Extract leftmost date (B1) and period (B2) for new-column detection
-            leftmost_date = None
-            leftmost_period = None
-            if sheet.max_column and sheet.max_column >= 2:
-                b1 = sheet.cell(row=1, column=2).value
-                b2 = sheet.cell(row=2, column=2).value
-                leftmost_date = str(b1) if b1 is not None else None
-                leftmost_period = str(b2) if b2 is not None else None
-
-            # Identify data rows (rows where column B has values)
-            data_rows = []
-            for r in range(3, max_row + 1):
-                if sheet.cell(row=r, column=2).value is not None:
-                    data_rows.append(r)
-
-            sheet_info = {
-                "name": sheet_name,
-                "max_row": max_row,
-                "max_col": max_col,
-                "headers": headers,
-                "rows": rows,
-                "empty_cells": empty_cells,
-                "total_empty_cells": len(empty_cells),
-                "leftmost_date": leftmost_date,
-                "leftmost_period": leftmost_period,
-                "data_rows": data_rows,
-            }
-
-            analysis["sheets"].append(sheet_info)
+            dimensions, max_row, max_col, grid = _read_sheet(workbook[sheet_name])
+            grid_cols = min(max_col, FULL_MAX_COL)
+            grid_rows = min(max_row, FULL_MAX_ROW)
+            col_letters = [get_column_letter(col) for col in range(1, grid_cols + 1)]
+
+            summary["sheets"].append(
+                _summarize_sheet(sheet_name, dimensions, max_row, max_col, grid, col_letters)
+            )
+            full["sheets"].append(_full_sheet(sheet_name, grid_rows, grid_cols, grid, col_letters))
 
         workbook.close()
-        return analysis
+        return summary, full
 
     except Exception as e:
-        return {"error": str(e), "file_name": file_path.name}
+        error = {"error": str(e), "file_name": file_name}
+        return error, error
+
+
+def _read_sheet(sheet) -> tuple[str, int, int, list[tuple]]:
+    """
+    Size a read-only sheet from its cells and read the capped value grid, in one pass.
+
+    The stored <dimension> tag is not trusted: a stale one would cut the grid
+    short, and the file could then look like it has no empty cells.
+
+    Returns:
+        Tuple of (dimensions, max_row, max_col, grid), where grid holds the
+        first FULL_MAX_ROW rows as value tuples of FULL_MAX_COL columns at most
+    """
+    sheet.reset_dimensions()
+    min_row = min_col = None
+    max_row = max_col = 0
+    grid = []
+    for row_idx, cells in enumerate(sheet.iter_rows(), start=1):
+        if row_idx <= FULL_MAX_ROW:
+            grid.append(tuple(cell.value for cell in cells[:FULL_MAX_COL]))
+        # Gaps in a row are padded with EMPTY_CELL; rows without cells are empty
+        first = next((col for col, cell in enumerate(cells, start=1) if cell is not EMPTY_CELL), None)
+        if first is None:
+            continue
+        if min_row is None:
+            min_row = row_idx
+        min_col = first if min_col is None else min(min_col, first)
+        max_row = row_idx
+        max_col = max(max_col, len(cells))
+
+    if min_row is None:
+        return "A1:A1", 1, 1, [(None,)]
+
+    # Pad every row to the same width, as iter_rows does for a sized sheet
+    grid_cols = min(max_col, FULL_MAX_COL)
+    grid = [row + (None,) * (grid_cols - len(row)) for row in grid[:max_row]]
+    dimensions = f"{get_column_letter(min_col)}{min_row}:{get_column_letter(max_col)}{max_row}"
+    return dimensions, max_row, max_col, grid
+
+
+def _summarize_sheet(
+    sheet_name: str,
+    dimensions: str,
+    max_row: int,
+    max_col: int,
+    grid: list[tuple],
+    col_letters: list[str],
+) -> dict[str, Any]:
+    """Build one sheet of analyze_excel_file from the shared grid."""
+    sheet_info = {
+        "name": sheet_name,
+        "dimensions": dimensions,
+        "max_row": max_row,
+        "max_col": max_col,
+        "headers": [],
+        "sample_data": [],
+        "empty_cells": [],
+    }
+
+    # Only the first 19 columns of the first 49 rows are inspected
+    scan_cols = min(max_col, SUMMARY_MAX_COL)
+    col_letters = col_letters[:scan_cols]
+    grid = [row_values[:scan_cols] for row_values in grid[:SUMMARY_MAX_ROW]]
+
+    # Get headers (first row)
+    if grid:
+        for col_letter, value in zip(col_letters, grid[0]):
+            if value:
+                sheet_info["headers"].append({
+                    "column": col_letter,
+                    "value": str(value)[:100],
+                })
+
+    # Get sample data (first 5 data rows)
+    for row, row_values in enumerate(grid[1:6], start=2):
+        row_data = {}
+        for col_letter, value in zip(col_letters, row_values):
+            if value is not None:
+                row_data[col_letter] = str(value)[:50]
+            else:
+                sheet_info["empty_cells"].append(f"{col_letter}{row}")
+
+        if row_data:
+            sheet_info["sample_data"].append(row_data)
+
+    # Look for cells that might need updating
+    empty_count = 0
+    seen_empty = set(sheet_info["empty_cells"])
+    for row, row_values in enumerate(grid[1:], start=2):
+        if len(sheet_info["empty_cells"]) >= 50:
+            # Sample list is full; only the count is still needed
+            empty_count += row_values.count(None)
+            continue
+        for col_letter, value in zip(col_letters, row_values):
+            if value is None:
+                if len(sheet_info["empty_cells"]) < 50:
+                    cell_ref = f"{col_letter}{row}"
+                    if cell_ref not in seen_empty:
+                        sheet_info["empty_cells"].append(cell_ref)
+                        seen_empty.add(cell_ref)
+                empty_count += 1
+
+    sheet_info["total_empty_cells"] = empty_count
+    return sheet_info
+
+
+def _full_sheet(
+    sheet_name: str,
+    max_row: int,
+    max_col: int,
+    grid: list[tuple],
+    col_letters: list[str],
+) -> dict[str, Any]:
+    """Build one sheet of analyze_excel_file_full from the shared grid."""
+    # Extract headers (row 1)
+    header_values = grid[0] if grid else (None,) * max_col
+    headers = [
+        f"{col_letter}: {str(val) if val is not None else ''}"
+        for col_letter, val in zip(col_letters, header_values)
+    ]
+
+    # Extract all data rows
+    rows = []
+    empty_cells = []
+
+    for row_idx, row_values in enumerate(grid[1:], start=2):
+        # Column A is the row label
+        label = str(row_values[0]) if row_values[0] is not None else ""
+
+        # Skip completely empty rows (no label, no data)
+        has_any_data = label != ""
+        cells = {}
+
+        for col_letter, val in zip(col_letters[1:], row_values[1:]):
+            if val is not None:
+                # Convert to string, preserve full numeric precision
+                if isinstance(val, float) and val == int(val):
+                    cells[col_letter] = str(int(val))
+                else:
+                    cells[col_letter] = str(val)
+                has_any_data = True
+            else:
+                cells[col_letter] = "EMPTY"
+                # Only track as empty if the row has a label
+                # (empty cells in label-less rows aren't meaningful)
+                if label:
+                    empty_cells.append(f"{col_letter}{row_idx}")
+
+        if has_any_data:
+            rows.append({
+                "row": row_idx,
+                "label": label,
+                "cells": cells,
+            })
+
+    # Extract leftmost date (B1) and period (B2) for new-column detection
+    leftmost_date = None
+    leftmost_period = None
+    if max_col >= 2:
+        b1 = grid[0][1] if len(grid) >= 1 else None
+        b2 = grid[1][1] if len(grid) >= 2 else None
+        leftmost_date = str(b1) if b1 is not None else None
+        leftmost_period = str(b2) if b2 is not None else None
+
+    # Identify data rows (rows where column B has values)
+    data_rows = []
+    if max_col >= 2:
+        data_rows = [
+            row_idx
+            for row_idx, row_values in enumerate(grid[2:], start=3)
+            if row_values[1] is not None
+        ]
+
+    return {
+        "name": sheet_name,
+        "max_row": max_row,
+        "max_col": max_col,
+        "headers": headers,
+        "rows": rows,
+        "empty_cells": empty_cells,
+        "total_empty_cells": len(empty_cells),
+        "leftmost_date": leftmost_date,
+        "leftmost_period": leftmost_period,
+        "data_rows": data_rows,
+    }
 
 
 def format_full_schema_for_llm(analysis: dict[str, Any]) -> str:
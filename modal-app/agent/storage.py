@@ -5,9 +5,11 @@ Handles downloading and uploading Excel files from/to the external storage bucke
 """
 
 import os
+import logging
 import httpx
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Optional
 
 # Bucket names for different file types
 BUCKET_MAPPING = {
@@ -19,6 +21,23 @@ BUCKET_MAPPING = {
     "financials-quarterly-cashflow": "financials-quarterly-cashflow",
 }
 
+log = logging.getLogger(__name__)
+
+# One pooled client for all transfers, so the per-bucket requests share
+# connections (multiplexed over HTTP/2 when h2 is installed) instead of each
+# paying its own TCP + TLS handshake
+try:
+    import h2  # noqa: F401
+    _HTTP2 = True
+except ImportError:
+    _HTTP2 = False
+
+_HTTP = httpx.Client(
+    http2=_HTTP2,
+    timeout=httpx.Timeout(60),
+    limits=httpx.Limits(max_connections=12, max_keepalive_connections=12),
+)
+
 
 class StorageClient:
     """Client for interacting with external Supabase storage."""
@@ -50,20 +69,22 @@ class StorageClient:
         url = f"{self.supabase_url}/storage/v1/object/public/{bucket}/{file_path}"
 
         try:
-            with httpx.Client() as client:
-                response = client.get(url, headers=self.headers, timeout=60)
-
+            # Stream the body straight to disk instead of buffering it
+            with _HTTP.stream("GET", url, headers=self.headers) as response:
                 if response.status_code == 200:
                     local_path.parent.mkdir(parents=True, exist_ok=True)
-                    local_path.write_bytes(response.content)
-                    print(f"Downloaded: {bucket}/{file_path} -> {local_path}")
+                    with local_path.open("wb") as f:
+                        for chunk in response.iter_bytes(chunk_size=65536):
+                            f.write(chunk)
+                    log.info(f"Downloaded: {bucket}/{file_path} -> {local_path}")
                     return True
                 else:
-                    print(f"Failed to download {bucket}/{file_path}: {response.status_code}")
+                    log.warning(f"Failed to download {bucket}/{file_path}: {response.status_code}")
                     return False
 
         except Exception as e:
-            print(f"Error downloading {bucket}/{file_path}: {e}")
+            log.error(f"Error downloading {bucket}/{file_path}: {e}")
+            local_path.unlink(missing_ok=True)
             return False
 
     def upload_file(self, bucket: str, file_path: str, local_path: Path) -> bool:
@@ -81,48 +102,64 @@ class StorageClient:
         url = f"{self.supabase_url}/storage/v1/object/{bucket}/{file_path}"
 
         try:
-            content = local_path.read_bytes()
-
             headers = {
                 **self.headers,
                 "Content-Type": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                 "x-upsert": "true",  # Upsert mode
             }
 
-            with httpx.Client() as client:
-                response = client.post(url, headers=headers, content=content, timeout=60)
+            # Send the file object so the body is streamed from disk
+            with local_path.open("rb") as content:
+                response = _HTTP.post(url, headers=headers, content=content)
 
                 if response.status_code in [200, 201]:
-                    print(f"Uploaded: {local_path} -> {bucket}/{file_path}")
+                    log.info(f"Uploaded: {local_path} -> {bucket}/{file_path}")
                     return True
                 else:
-                    print(f"Failed to upload to {bucket}/{file_path}: {response.status_code} - {response.text}")
+                    log.error(f"Failed to upload to {bucket}/{file_path}: {response.status_code} - {response.text}")
                     return False
 
         except Exception as e:
-            print(f"Error uploading to {bucket}/{file_path}: {e}")
+            log.error(f"Error uploading to {bucket}/{file_path}: {e}")
             return False
 
-    def download_all_files(self, ticker: str, work_dir: Path) -> dict[str, Path]:
+    def download_all_files(
+        self,
+        ticker: str,
+        work_dir: Path,
+        on_download: Callable[[str, Path], None] | None = None,
+    ) -> dict[str, Path]:
         """
         Download all 6 Excel files for a ticker.
 
         Args:
             ticker: Stock ticker symbol
             work_dir: Working directory to save files
+            on_download: Called with (bucket name, local path) as soon as each
+                file has downloaded, on the download thread
 
         Returns:
             Dict mapping bucket names to local file paths
         """
         files = {}
         file_name = f"{ticker}.xlsx"
-
-        for bucket_name in BUCKET_MAPPING.values():
-            local_path = work_dir / bucket_name / file_name
-            if self.download_file(bucket_name, file_name, local_path):
-                files[bucket_name] = local_path
-            else:
-                print(f"Warning: Could not download {bucket_name}/{file_name}")
+        buckets = list(BUCKET_MAPPING.values())
+        local_paths = [work_dir / bucket_name / file_name for bucket_name in buckets]
+
+        def download(bucket_name: str, local_path: Path) -> bool:
+            ok = self.download_file(bucket_name, file_name, local_path)
+            if ok and on_download:
+                on_download(bucket_name, local_path)
+            return ok
+
+        # Independent requests: fetch all buckets at once
+        with ThreadPoolExecutor(max_workers=len(buckets)) as pool:
+            results = pool.map(download, buckets, local_paths)
+            for bucket_name, local_path, ok in zip(buckets, local_paths, results):
+                if ok:
+                    files[bucket_name] = local_path
+                else:
+                    log.warning(f"Warning: Could not download {bucket_name}/{file_name}")
 
         return files
 
@@ -138,11 +175,14 @@ class StorageClient:
             Number of successfully uploaded files
         """
         file_name = f"{ticker}.xlsx"
-        uploaded = 0
-
-        for bucket_name, local_path in files.items():
-            if local_path.exists():
-                if self.upload_file(bucket_name, file_name, local_path):
-                    uploaded += 1
-
-        return uploaded
+        existing = [(bucket_name, local_path) for bucket_name, local_path in files.items() if local_path.exists()]
+        if not existing:
+            return 0
+
+        # Independent requests: upload all buckets at once
+        with ThreadPoolExecutor(max_workers=len(existing)) as pool:
+            results = pool.map(
+                lambda args: self.upload_file(*args),
+                [(bucket_name, file_name, local_path) for bucket_name, local_path in existing],
+            )
+            return sum(results)
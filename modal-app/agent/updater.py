@@ -4,11 +4,31 @@ Excel file updater using openpyxl.
 Handles updating specific cells in Excel files based on AI instructions.
 """
 
+import datetime
+import logging
+import threading
+from collections import defaultdict
 from copy import copy
 from pathlib import Path
 from typing import Any
+from zipfile import ZIP_DEFLATED, ZipFile
 import openpyxl
 from openpyxl.utils import column_index_from_string
+from openpyxl.writer.excel import ExcelWriter
+
+log = logging.getLogger(__name__)
+
+# zlib level for saved workbooks. Saving is dominated by compression, and
+# level 3 is several times cheaper than openpyxl's default of 6 for output
+# only a few percent larger, which suits files that are uploaded right away.
+SAVE_COMPRESSLEVEL = 3
+
+
+def _save_workbook(workbook, file_path: Path):
+    """Same as openpyxl's save_workbook, with SAVE_COMPRESSLEVEL compression."""
+    archive = ZipFile(file_path, "w", ZIP_DEFLATED, allowZip64=True, compresslevel=SAVE_COMPRESSLEVEL)
+    workbook.properties.modified = datetime.datetime.now(tz=datetime.timezone.utc).replace(tzinfo=None)
+    ExcelWriter(workbook, archive).save()
 
 
 class ExcelUpdater:
@@ -16,8 +36,18 @@ class ExcelUpdater:
 
     def __init__(self, file_path: Path):
         self.file_path = file_path
-        self.workbook = openpyxl.load_workbook(file_path)
+        # The financial files carry no macros or external workbook links, so
+        # those parts are not parsed (or written back on save)
+        self.workbook = openpyxl.load_workbook(
+            file_path, keep_vba=False, keep_links=False, data_only=False, rich_text=False
+        )
         self.changes_made = 0
+        # openpyxl workbooks are not thread-safe; tool calls for a file may
+        # run on background threads, so edits and saves are serialized
+        self.lock = threading.Lock()
+        # workbook.sheetnames builds a new list on every access; the updater
+        # never adds, removes or renames sheets, so membership is checked here
+        self._sheetset = set(self.workbook.sheetnames)
 
     def update_cell(self, sheet_name: str, cell_ref: str, value: Any) -> bool:
         """
@@ -31,32 +61,68 @@ class ExcelUpdater:
         Returns:
             True if successful, False otherwise
         """
-        try:
-            if sheet_name not in self.workbook.sheetnames:
-                print(f"Sheet '{sheet_name}' not found")
-                return False
+        with self.lock:
+            return self._update_cell(sheet_name, cell_ref, value)
 
-            sheet = self.workbook[sheet_name]
-            sheet[cell_ref] = value
+    def _update_cell(self, sheet_name: str, cell_ref: str, value: Any) -> bool:
+        if sheet_name not in self._sheetset:
+            log.warning(f"Sheet '{sheet_name}' not found")
+            return False
+
+        if not self._write_cell(self.workbook[sheet_name], cell_ref, value):
+            return False
+        # Per-cell detail is debug-only and formatted lazily: batches run to
+        # hundreds of cells, and update_cells logs one summary line instead
+        log.debug("Updated %s!%s = %s", sheet_name, cell_ref, value)
+        return True
+
+    def _write_cell(self, sheet, cell_ref: str, value: Any) -> bool:
+        """Set one cell, styling new column B cells like their column C neighbour."""
+        try:
+            cell = sheet[cell_ref]
+            cell.value = value
             self.changes_made += 1
 
             # Auto-copy formatting from column C when writing to column B
-            cell = sheet[cell_ref]
             if cell.column == 2:  # Column B
                 source = sheet.cell(row=cell.row, column=3)  # Column C
-                cell.font = copy(source.font)
-                cell.fill = copy(source.fill)
-                cell.alignment = copy(source.alignment)
-                cell.border = copy(source.border)
-                cell.number_format = source.number_format
+                cell._style = copy(source._style)
 
-            print(f"Updated {sheet_name}!{cell_ref} = {value}")
             return True
 
         except Exception as e:
-            print(f"Error updating cell {sheet_name}!{cell_ref}: {e}")
+            log.warning(f"Error updating cell {sheet.title}!{cell_ref}: {e}")
             return False
 
+    def update_cells(self, updates: list[dict]) -> list[bool]:
+        """
+        Update multiple cells, holding the workbook lock once for all of them.
+
+        Updates are grouped by sheet so each sheet is looked up once.
+
+        Args:
+            updates: List of dicts with keys: sheet_name, cell_ref, value
+
+        Returns:
+            Success of each update, in order
+        """
+        results = [False] * len(updates)
+        by_sheet = defaultdict(list)
+        for i, update in enumerate(updates):
+            by_sheet[update["sheet_name"]].append(i)
+
+        with self.lock:
+            for sheet_name, indices in by_sheet.items():
+                if sheet_name not in self._sheetset:
+                    log.warning(f"Sheet '{sheet_name}' not found")
+                    continue
+                sheet = self.workbook[sheet_name]
+                for i in indices:
+                    results[i] = self._write_cell(sheet, updates[i]["cell_ref"], updates[i]["value"])
+
+        log.info(f"Updated {sum(results)}/{len(updates)} cells in {self.file_path.name}")
+        return results
+
     def update_cells_batch(self, updates: list[dict]) -> int:
         """
         Update multiple cells at once.
@@ -67,15 +133,7 @@ class ExcelUpdater:
         Returns:
             Number of successful updates
         """
-        successful = 0
-        for update in updates:
-            if self.update_cell(
-                update["sheet_name"],
-                update["cell_ref"],
-                update["value"]
-            ):
-                successful += 1
-        return successful
+        return sum(self.update_cells(updates))
 
     def save(self) -> bool:
         """
@@ -85,11 +143,12 @@ class ExcelUpdater:
             True if successful, False otherwise
         """
         try:
-            self.workbook.save(self.file_path)
-            print(f"Saved {self.file_path} with {self.changes_made} changes")
+            with self.lock:
+                _save_workbook(self.workbook, self.file_path)
+            log.info(f"Saved {self.file_path} with {self.changes_made} changes")
             return True
         except Exception as e:
-            print(f"Error saving {self.file_path}: {e}")
+            log.error(f"Error saving {self.file_path}: {e}")
             return False
 
     def close(self):
@@ -110,8 +169,14 @@ class ExcelUpdater:
         Returns:
             Dict with success status and list of row numbers needing data
         """
+        with self.lock:
+            return self._insert_new_period_column(sheet_name, date_header, period_header)
+
+    def _insert_new_period_column(
+        self, sheet_name: str, date_header: str, period_header: str
+    ) -> dict:
         try:
-            if sheet_name not in self.workbook.sheetnames:
+            if sheet_name not in self._sheetset:
                 return {"success": False, "error": f"Sheet '{sheet_name}' not found"}
 
             sheet = self.workbook[sheet_name]
@@ -124,32 +189,35 @@ class ExcelUpdater:
             sheet.cell(row=2, column=2).value = period_header
             self.changes_made += 2
 
-            # Copy header styling from column C (the shifted original) to new column B
+            # Copy header styling from column C (the shifted original) to new column B.
+            # A cell's style is a small array of indices into the workbook's shared
+            # style tables, so copying it reuses the existing font/fill/border
+            # entries instead of copying and re-registering each style object.
             for row in [1, 2]:
                 source_cell = sheet.cell(row=row, column=3)
                 target_cell = sheet.cell(row=row, column=2)
-                target_cell.font = copy(source_cell.font)
-                target_cell.fill = copy(source_cell.fill)
-                target_cell.alignment = copy(source_cell.alignment)
-                target_cell.border = copy(source_cell.border)
-                target_cell.number_format = source_cell.number_format
+                target_cell._style = copy(source_cell._style)
 
             # Scan column C (the old column B, now shifted right) to find rows with data
             # Build a row_map with labels from column A for direct agent guidance
+            # Only column C is iterated (as plain values): reading A and B for
+            # every row would also materialize their empty cells in the sheet
             data_rows = []
             row_map = []
-            for row_idx in range(3, (sheet.max_row or 2) + 1):
-                cell_c = sheet.cell(row=row_idx, column=3)
-                if cell_c.value is not None:
+            # max_row walks every stored cell, so it is read once up front
+            max_row = sheet.max_row or 2
+            column_c = sheet.iter_rows(min_row=3, max_row=max_row, min_col=3, max_col=3, values_only=True)
+            for row_idx, (c_value,) in enumerate(column_c, start=3):
+                if c_value is not None:
                     data_rows.append(row_idx)
                     label = sheet.cell(row=row_idx, column=1).value or ""
                     row_map.append({"row": row_idx, "label": str(label).strip(), "cell": f"B{row_idx}"})
 
-            print(f"Inserted new column B in {sheet_name}: {date_header} / {period_header}")
-            print(f"  {len(data_rows)} rows need data (rows with values in adjacent column)")
+            log.info(f"Inserted new column B in {sheet_name}: {date_header} / {period_header}")
+            log.info(f"  {len(data_rows)} rows need data (rows with values in adjacent column)")
 
             # Build a human-readable cell list for the agent
-            cell_list = ", ".join(f"B{r} ({m['label']})" for r, m in zip(data_rows[:50], row_map[:50]))
+            cell_list = ", ".join([f"{m['cell']} ({m['label']})" for m in row_map[:50]])
             if len(data_rows) > 50:
                 cell_list += f"... ({len(data_rows)} total)"
 
@@ -162,7 +230,7 @@ class ExcelUpdater:
             }
 
         except Exception as e:
-            print(f"Error inserting column in {sheet_name}: {e}")
+            log.error(f"Error inserting column in {sheet_name}: {e}")
             return {"success": False, "error": str(e)}
 
     def __enter__(self):
@@ -183,6 +251,10 @@ def update_file(file_path: Path, updates: list[dict]) -> tuple[bool, int]:
     Returns:
         Tuple of (success, number of changes)
     """
+    if not updates:
+        # Nothing to write: skip parsing the file
+        return True, 0
+
     with ExcelUpdater(file_path) as updater:
         count = updater.update_cells_batch(updates)
         if count > 0:
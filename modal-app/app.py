@@ -19,20 +19,28 @@ from datetime import datetime
 # Define the Modal app
 app = modal.App("excel-agent")
 
-# Create image with all dependencies
-image = (
+# Base image. Layers are ordered from least to most frequently changed, so
+# editing the Python dependencies or the agent code does not rebuild the
+# Chromium layer (the slowest to build). The browser path is set explicitly
+# so install and runtime agree on it.
+image_base = (
     modal.Image.debian_slim(python_version="3.11")
+    .pip_install("playwright>=1.40.0")
+    .env({"PLAYWRIGHT_BROWSERS_PATH": "/root/.cache/ms-playwright"})
+    .run_commands("playwright install chromium", "playwright install-deps chromium")
     .pip_install(
-        "anthropic>=0.40.0",
+        "anthropic>=0.52.0",
         "openpyxl>=3.1.2",
-        "playwright>=1.40.0",
-        "httpx>=0.27.0",
+        "lxml>=5.0.0",  # openpyxl parses and writes XML through lxml when installed
+        "httpx[http2]>=0.27.0",
+        "orjson>=3.9.0",
         "fastapi[standard]>=0.115.0",
     )
-    .run_commands("playwright install chromium", "playwright install-deps chromium")
-    .add_local_dir("agent", remote_path="/usr/local/lib/python3.11/site-packages/agent")
 )
 
+# Agent code goes in last, so a code change only rebuilds this thin layer
+image = image_base.add_local_dir("agent", remote_path="/usr/local/lib/python3.11/site-packages/agent")
+
 # Secrets for API access
 secrets = [
     modal.Secret.from_name("anthropic-secret"),  # ANTHROPIC_API_KEY
@@ -44,6 +52,40 @@ secrets = [
 ]
 
 
+# Callback POSTs reuse one connection pool per container instead of opening
+# a new TCP + TLS connection per attempt. The transport retries a failed
+# connection once, immediately. Created lazily: httpx is only installed in
+# the image, not necessarily where `modal deploy` runs.
+_CALLBACK_CLIENT = None
+
+
+def _callback_client():
+    """Return the shared httpx client for callback POSTs."""
+    global _CALLBACK_CLIENT
+    if _CALLBACK_CLIENT is None:
+        import httpx
+
+        _CALLBACK_CLIENT = httpx.Client(
+            transport=httpx.HTTPTransport(http2=True, retries=1),
+            timeout=30,
+        )
+    return _CALLBACK_CLIENT
+
+
+def _post_callback(callback_url: str, payload: dict, webhook_secret: str, ticker: str, label: str):
+    """POST a result payload to callback_url; connection failures are retried by the transport."""
+    try:
+        resp = _callback_client().post(
+            callback_url,
+            json=payload,
+            headers={"Authorization": f"Bearer {webhook_secret}"},
+            timeout=30,
+        )
+        print(f"{label} sent for {ticker}: {resp.status_code}")
+    except Exception as cb_err:
+        print(f"{label} failed for {ticker}: {cb_err}")
+
+
 @app.function(image=image, secrets=secrets, timeout=1800)
 def process_ticker(
     ticker: str,
@@ -64,13 +106,49 @@ def process_ticker(
     Returns:
         dict with status, files_updated count, and any errors
     """
-    import httpx
+    return _process_ticker(ticker, report_date, timing, fiscal_period_end, callback_url)
+
+
+@app.function(image=image, secrets=secrets, timeout=24 * 3600)
+def process_ticker_low_priority(
+    ticker: str,
+    report_date: str,
+    timing: str,
+    fiscal_period_end: str | None = None,
+    callback_url: str | None = None,
+) -> dict:
+    """
+    Process a ticker that is not latency-critical (e.g. a backfill).
+
+    All Claude turns go through the Message Batches API at half price, which
+    can take hours, hence the longer timeout.
+    """
+    from agent.orchestrator import FILE_ORDER
+
+    return _process_ticker(
+        ticker, report_date, timing, fiscal_period_end, callback_url, batch_files=FILE_ORDER
+    )
+
+
+def _process_ticker(
+    ticker: str,
+    report_date: str,
+    timing: str,
+    fiscal_period_end: str | None = None,
+    callback_url: str | None = None,
+    batch_files: list[str] | None = None,
+) -> dict:
+    """Run the agent for a ticker and report the outcome to callback_url."""
     from agent.orchestrator import run_agent
 
     print(f"Processing ticker: {ticker} for {report_date} ({timing})")
 
     try:
-        result = run_agent(ticker, report_date, timing, fiscal_period_end=fiscal_period_end)
+        result = run_agent(
+            ticker, report_date, timing,
+            fiscal_period_end=fiscal_period_end,
+            batch_files=batch_files,
+        )
 
         # Report back to Lovable if callback URL provided
         if callback_url:
@@ -84,21 +162,7 @@ def process_ticker(
                 "data_sources_used": result.get("data_sources", []),
                 "error_message": result.get("error"),
             }
-            for attempt in range(2):
-                try:
-                    resp = httpx.post(
-                        callback_url,
-                        json=callback_payload,
-                        headers={"Authorization": f"Bearer {webhook_secret}"},
-                        timeout=30,
-                    )
-                    print(f"Callback sent for {ticker}: {resp.status_code}")
-                    break
-                except Exception as cb_err:
-                    print(f"Callback attempt {attempt + 1} failed for {ticker}: {cb_err}")
-                    if attempt == 0:
-                        import time as _time
-                        _time.sleep(5)
+            _post_callback(callback_url, callback_payload, webhook_secret, ticker, "Callback")
 
         return result
 
@@ -116,21 +180,7 @@ def process_ticker(
                 "status": "failed",
                 "error_message": error_msg,
             }
-            for attempt in range(2):
-                try:
-                    resp = httpx.post(
-                        callback_url,
-                        json=fail_payload,
-                        headers={"Authorization": f"Bearer {webhook_secret}"},
-                        timeout=30,
-                    )
-                    print(f"Failure callback sent for {ticker}: {resp.status_code}")
-                    break
-                except Exception as cb_err:
-                    print(f"Failure callback attempt {attempt + 1} failed for {ticker}: {cb_err}")
-                    if attempt == 0:
-                        import time as _time
-                        _time.sleep(5)
+            _post_callback(callback_url, fail_payload, webhook_secret, ticker, "Failure callback")
 
         return {"success": False, "error": error_msg}
 
@@ -147,41 +197,38 @@ def webhook(data: dict) -> dict:
             {"ticker": "AAPL", "report_date": "2024-01-15", "timing": "afterhours"},
             ...
         ],
-        "callback_url": "https://..."
+        "callback_url": "https://...",
+        "low_priority": false  # optional; true routes Claude calls via the Batches API
     }
     """
-    import os
-    from fastapi import Request, HTTPException
-
     # Note: In production, verify the webhook secret from Authorization header
     # For now, we trust the caller
 
     tickers = data.get("tickers", [])
     callback_url = data.get("callback_url")
+    processor = process_ticker_low_priority if data.get("low_priority") else process_ticker
 
     if not tickers:
         return {"success": False, "error": "No tickers provided"}
 
     print(f"Received webhook with {len(tickers)} tickers")
 
-    # Spawn parallel processing for all tickers
-    # Using .map() for efficient parallel execution
-    futures = []
-    for t in tickers:
-        futures.append(
-            process_ticker.spawn(
-                ticker=t["ticker"],
-                report_date=t["report_date"],
-                timing=t["timing"],
-                fiscal_period_end=t.get("fiscal_period_end"),
-                callback_url=callback_url,
-            )
-        )
+    # Spawn parallel processing for all tickers in one batched submission
+    # rather than one control-plane round trip per ticker. Results come back
+    # through callback_url, so nothing is awaited here.
+    ticker_symbols = [t["ticker"] for t in tickers]
+    processor.spawn_map(
+        ticker_symbols,
+        [t["report_date"] for t in tickers],
+        [t["timing"] for t in tickers],
+        [t.get("fiscal_period_end") for t in tickers],
+        kwargs={"callback_url": callback_url},
+    )
 
     return {
         "success": True,
         "message": f"Spawned processing for {len(tickers)} tickers",
-        "tickers": [t["ticker"] for t in tickers],
+        "tickers": ticker_symbols,
     }
 
 